@@ -1,52 +1,108 @@
-import logging, sys
+import asyncio, json, logging, os, sys
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from threading import Event, Lock
 from time import time
-from typing import Dict, Tuple
-from decimal import Decimal
+from typing import Dict, List, Tuple
 
-from fastapi import FastAPI, HTTPException, Header, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Header, Query, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 
-from .models import MoneyChange, Error
-from .store import Store
+from .models import Balance, Batch, Error, MoneyChange, Transactions
+from .store import Store, format_cents
 
-# Structured logging
+# Structured logging; per-request info logs are skipped entirely (no extra
+# dict built) when LOG_LEVEL is above INFO, e.g. LOG_LEVEL=WARNING in prod.
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     stream=sys.stdout,
     format="%(asctime)s %(levelname)s %(name)s %(message)s",
 )
 log = logging.getLogger("atm")
 
-app = FastAPI(title="Mini ATM System", version="1.1.0")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    sweeper = asyncio.create_task(_sweep_loop())
+    yield
+    sweeper.cancel()
+
+# Endpoints declare a response_model so FastAPI serializes straight to JSON
+# bytes in pydantic-core instead of jsonable_encoder + json.dumps.
+app = FastAPI(title="Mini ATM System", version="1.1.0", lifespan=lifespan)
 
 # In-memory store
 store = Store()
 store.seed()
 
-# Idempotency cache: key -> (timestamp, response_dict)
+# Idempotency cache: key -> (timestamp, response_dict), sharded by key hash
+# so requests with different keys rarely contend on the same lock.
+# Insertion order == expiry order, so expired entries are always at the head.
+# Each shard also tracks keys whose first request is still running, so
+# concurrent retries wait for that result instead of applying twice.
 IDEMP_TTL = 10 * 60  # seconds
-idemp_cache: Dict[str, Tuple[float, dict]] = {}
-
-def idempotent_response(key: str | None, compute):
-    now = time()
-    # simple sweep to purge expired
-    for k, (t, _) in list(idemp_cache.items()):
-        if now - t > IDEMP_TTL:
-            idemp_cache.pop(k, None)
+IDEMP_SHARDS = 16  # must be a power of two
+IDEMP_SWEEP_INTERVAL = 30  # seconds between background evictions
+idemp_shards: List[Tuple[Lock, "OrderedDict[str, Tuple[float, dict]]", Dict[str, Event]]] = [
+    (Lock(), OrderedDict(), {}) for _ in range(IDEMP_SHARDS)
+]
+
+def _evict_expired(now: float) -> None:
+    """Drop expired entries from the head of every shard.
+
+    Runs on the event loop, so busy shards are skipped rather than waited
+    on; they are picked up on the next pass.
+    """
+    for lock, shard, _ in idemp_shards:
+        if not lock.acquire(blocking=False):
+            continue
+        try:
+            while shard and now - next(iter(shard.values()))[0] > IDEMP_TTL:
+                shard.popitem(last=False)
+        finally:
+            lock.release()
+
+async def _sweep_loop() -> None:
+    # TTL eviction runs here, off the request path
+    while True:
+        await asyncio.sleep(IDEMP_SWEEP_INTERVAL)
+        _evict_expired(time())
+
+def idempotent_response(key: str | None, compute, *args):
     if not key:
-        return compute()
-    if key in idemp_cache:
-        log.info("idempotency hit", extra={"idempotency_key": key})
-        return idemp_cache[key][1]
-    result = compute()
-    idemp_cache[key] = (now, result)
-    return result
-
-# --- Exception mappers for consistent error schema ---
+        return compute(*args)
+    lock, shard, inflight = idemp_shards[hash(key) & (IDEMP_SHARDS - 1)]
+    while True:
+        now = time()
+        # the shard lock only guards lookup/insert, never the store operation
+        with lock:
+            hit = shard.get(key)
+            if hit is not None:
+                if now - hit[0] <= IDEMP_TTL:
+                    if log.isEnabledFor(logging.INFO):
+                        log.info("idempotency hit", extra={"idempotency_key": key})
+                    return hit[1]
+                del shard[key]
+            pending = inflight.get(key)
+            if pending is None:
+                done = inflight[key] = Event()
+                break
+        # same key already running: wait, then re-check (it may have failed)
+        pending.wait()
+    try:
+        result = compute(*args)
+        with lock:
+            shard[key] = (now, result)
+        return result
+    finally:
+        with lock:
+            del inflight[key]
+        done.set()
+
+# --- Exception mappers for consistent error schema (models.Error) ---
 @app.exception_handler(HTTPException)
 async def http_exc_handler(_: Request, exc: HTTPException):
-    return JSONResponse(status_code=exc.status_code, content=Error(error=str(exc.detail)).model_dump())
+    return JSONResponse(status_code=exc.status_code, content={"error": str(exc.detail)})
 
 @app.exception_handler(RequestValidationError)
 async def validation_exc_handler(_: Request, exc: RequestValidationError):
@@ -58,63 +114,79 @@ async def validation_exc_handler(_: Request, exc: RequestValidationError):
             msg = exc.errors()[0].get("msg", msg)
     except Exception:
         pass
-    return JSONResponse(status_code=422, content=Error(error=msg).model_dump())
+    return JSONResponse(status_code=422, content={"error": msg})
 
 @app.exception_handler(ValueError)
 async def value_error_handler(_: Request, exc: ValueError):
-    return JSONResponse(status_code=400, content=Error(error=str(exc)).model_dump())
+    return JSONResponse(status_code=400, content={"error": str(exc)})
 
 # --- Endpoints ---
+# documents the error schema in OpenAPI for the account routes
+_NOT_FOUND = {404: {"model": Error}}
+_REJECTED = {400: {"model": Error}, 404: {"model": Error}}
+
+def _balance_after(op, account_number: str, arg) -> dict:
+    # module-level so mutating endpoints don't allocate a closure per request
+    bal: int = op(account_number, arg)
+    return {"account_number": account_number, "balance": format_cents(bal)}
+
+# Liveness probe body never changes, so encode it once at import. A fresh
+# Response is still built per probe: FastAPI attaches per-request state
+# (background tasks) to whatever Response an endpoint returns.
+_HEALTH_BODY = json.dumps({"status": "ok", "version": app.version}, separators=(",", ":")).encode()
+
 @app.get("/healthz")
 def health():
-    return {"status": "ok", "version": app.version}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
-@app.get("/accounts/{account_number}/balance")
+@app.get("/accounts/{account_number}/balance", response_model=Balance, responses=_NOT_FOUND)
 def get_balance(account_number: str):
-    log.info("get_balance", extra={"account": account_number})
+    if log.isEnabledFor(logging.INFO):
+        log.info("get_balance", extra={"account": account_number})
     try:
-        bal: Decimal = store.get_balance(account_number)
-        return {"account_number": account_number, "balance": str(bal)}
+        bal: int = store.get_balance(account_number)
+        return {"account_number": account_number, "balance": format_cents(bal)}
     except KeyError:
         raise HTTPException(status_code=404, detail="account not found")
 
-@app.post("/accounts/{account_number}/deposit")
+@app.post("/accounts/{account_number}/deposit", response_model=Balance, responses=_NOT_FOUND)
 def deposit(account_number: str, body: MoneyChange, idempotency_key: str | None = Header(default=None, alias="Idempotency-Key")):
-    log.info("deposit", extra={"account": account_number, "amount": str(body.amount), "idempotency_key": idempotency_key})
-    def _do():
-        bal: Decimal = store.deposit(account_number, body.amount)
-        return {"account_number": account_number, "balance": str(bal)}
+    if log.isEnabledFor(logging.INFO):
+        log.info("deposit", extra={"account": account_number, "amount": str(body.amount), "idempotency_key": idempotency_key})
     try:
-        return idempotent_response(idempotency_key, _do)
+        return idempotent_response(idempotency_key, _balance_after, store.deposit, account_number, body.amount)
     except KeyError:
         raise HTTPException(status_code=404, detail="account not found")
 
-@app.post("/accounts/{account_number}/withdraw")
+@app.post("/accounts/{account_number}/withdraw", response_model=Balance, responses=_REJECTED)
 def withdraw(account_number: str, body: MoneyChange, idempotency_key: str | None = Header(default=None, alias="Idempotency-Key")):
-    log.info("withdraw", extra={"account": account_number, "amount": str(body.amount), "idempotency_key": idempotency_key})
-    def _do():
-        bal: Decimal = store.withdraw(account_number, body.amount)
-        return {"account_number": account_number, "balance": str(bal)}
+    if log.isEnabledFor(logging.INFO):
+        log.info("withdraw", extra={"account": account_number, "amount": str(body.amount), "idempotency_key": idempotency_key})
+    try:
+        return idempotent_response(idempotency_key, _balance_after, store.withdraw, account_number, body.amount)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="account not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/accounts/{account_number}/batch", response_model=Balance, responses=_REJECTED)
+def batch(account_number: str, body: Batch, idempotency_key: str | None = Header(default=None, alias="Idempotency-Key")):
+    if log.isEnabledFor(logging.INFO):
+        log.info("batch", extra={"account": account_number, "ops": len(body.ops), "idempotency_key": idempotency_key})
+    ops = [(op.type, op.amount) for op in body.ops]
     try:
-        return idempotent_response(idempotency_key, _do)
+        return idempotent_response(idempotency_key, _balance_after, store.apply_batch, account_number, ops)
     except KeyError:
         raise HTTPException(status_code=404, detail="account not found")
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@app.get("/accounts/{account_number}/transactions")
-def txns(account_number: str):
-    log.info("transactions", extra={"account": account_number})
+@app.get("/accounts/{account_number}/transactions", response_model=Transactions, responses=_NOT_FOUND)
+def txns(account_number: str, limit: int = Query(default=100, ge=1, le=1000), offset: int = Query(default=0, ge=0)):
+    if log.isEnabledFor(logging.INFO):
+        log.info("transactions", extra={"account": account_number, "limit": limit, "offset": offset})
     try:
-        txlist = store.transactions(account_number)
-        # serialize for JSON (convert Decimals and datetimes to strings)
-        def _ser(tx):
-            return {
-                "ts": tx.ts.isoformat().replace("+00:00", "Z"),
-                "type": tx.type,
-                "amount": str(tx.amount),
-                "balance": str(tx.balance),
-            }
-        return {"account_number": account_number, "transactions": [_ser(t) for t in txlist]}
+        txlist = store.transactions(account_number, limit=limit, offset=offset)
+        return {"account_number": account_number, "transactions": txlist}
     except KeyError:
         raise HTTPException(status_code=404, detail="account not found")
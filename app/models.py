@@ -1,28 +1,41 @@
+from dataclasses import dataclass
 from decimal import Decimal
-from datetime import datetime
-from pydantic import BaseModel, Field, field_validator
+from typing import List, Literal
+from pydantic import BaseModel, Field
 
-class Account(BaseModel):
-    """Simple account model held in memory."""
+@dataclass(slots=True)
+class Account:
+    """Simple account model held in memory (balance in integer cents)."""
     account_number: str
-    balance: Decimal = Field(default=Decimal("0.00"))
+    balance: int = 0
 
 class MoneyChange(BaseModel):
     """Request body for deposit/withdraw endpoints."""
-    amount: Decimal = Field(..., description="Positive amount in currency units")
+    # constraints are enforced by pydantic-core, no Python validator per request
+    amount: Decimal = Field(..., gt=0, max_digits=18, description="Positive amount in currency units")
 
-    @field_validator("amount")
-    @classmethod
-    def positive(cls, v: Decimal) -> Decimal:
-        if v <= 0:
-            raise ValueError("amount must be > 0")
-        return v
+class BatchOp(MoneyChange):
+    """One deposit/withdraw inside a batch request."""
+    type: Literal["deposit", "withdraw"]
+
+class Batch(BaseModel):
+    """Request body for the batch endpoint; ops are applied in order."""
+    ops: List[BatchOp] = Field(..., min_length=1, max_length=100)
 
 class Error(BaseModel):
     error: str
 
+class Balance(BaseModel):
+    """Response body for balance and money-movement endpoints."""
+    account_number: str
+    balance: str
+
 class Txn(BaseModel):
-    ts: datetime
+    ts: str
     type: str  # "deposit" | "withdraw"
-    amount: Decimal
-    balance: Decimal
+    amount: str
+    balance: str
+
+class Transactions(BaseModel):
+    account_number: str
+    transactions: List[Txn]
@@ -1,30 +1,55 @@
-from decimal import Decimal, ROUND_HALF_UP
+from decimal import Decimal
 from threading import Lock
-from typing import Dict, List
-from collections import defaultdict
+from typing import Deque, Dict, List, Tuple
+from collections import defaultdict, deque
+from itertools import islice
 from datetime import datetime, timezone
 
-from .models import Account, Txn
+from .models import Account
 
-_TWO_DP = Decimal("0.01")
+def _to_cents(v: Decimal) -> int:
+    """Convert a non-negative money amount to integer cents (ROUND_HALF_UP).
 
-def _money(v: Decimal) -> Decimal:
-    """Normalize money to 2 decimal places (ROUND_HALF_UP)."""
-    return v.quantize(_TWO_DP, rounding=ROUND_HALF_UP)
+    Amounts are validated > 0 at the API boundary, so only the magnitude
+    case is handled: truncate to mills, then round the last digit half-up.
+    """
+    q, r = divmod(int(v * 1000), 10)
+    return q + (r >= 5)
+
+def format_cents(c: int) -> str:
+    """Render integer cents as a 2dp money string, e.g. 55000 -> "550.00"."""
+    return f"{c // 100}.{c % 100:02d}"
+
+def _now_iso() -> str:
+    """Current UTC time as an ISO-8601 string with a trailing "Z"."""
+    return datetime.now(tz=timezone.utc).isoformat(timespec="microseconds").replace("+00:00", "Z")
+
+# number of lock stripes shared by all accounts; must be a power of two
+LOCK_STRIPES = 256
+
+# max audit rows kept per account; older rows are dropped
+AUDIT_LOG_MAXLEN = 10_000
+
+def _new_log() -> Deque[dict]:
+    return deque(maxlen=AUDIT_LOG_MAXLEN)
 
 class Store:
-    """In-memory data store with per-account locks and an audit log."""
+    """In-memory data store with striped account locks and an audit log.
+
+    Balances and transaction amounts are held as integer cents.
+    """
     def __init__(self) -> None:
         self._accounts: Dict[str, Account] = {}
-        # per-account locks
-        self._locks: Dict[str, Lock] = {}
-        # audit log per account
-        self._log: Dict[str, List[Txn]] = defaultdict(list)
+        # fixed stripe of locks; unrelated accounts may share one
+        self._stripes: List[Lock] = [Lock() for _ in range(LOCK_STRIPES)]
+        # bounded audit log per account, rows stored already serialized for JSON
+        self._log: Dict[str, Deque[dict]] = defaultdict(_new_log)
 
     # ----- admin/seed -----
     def seed(self) -> None:
-        for num, bal in [("1001", "500.00"), ("1002", "1250.75"), ("9999", "0.00")]:
-            self._accounts[num] = Account(account_number=num, balance=_money(Decimal(bal)))
+        for num, cents in [("1001", 50000), ("1002", 125075), ("9999", 0)]:
+            self._accounts[num] = Account(account_number=num, balance=cents)
+            self._log[num] = _new_log()
 
     # ----- helpers -----
     def _require(self, account_number: str) -> Account:
@@ -33,51 +58,75 @@ class Store:
         except KeyError:
             raise KeyError("account not found")
 
-    def _get_lock(self, account_number: str) -> Lock:
-        # create lock lazily
-        lock = self._locks.get(account_number)
-        if lock is None:
-            lock = Lock()
-            self._locks[account_number] = lock
-        return lock
+    def _lock_for(self, account_number: str) -> Lock:
+        return self._stripes[hash(account_number) & (LOCK_STRIPES - 1)]
 
     # ----- operations -----
-    def get_balance(self, account_number: str) -> Decimal:
+    def get_balance(self, account_number: str) -> int:
         acc = self._require(account_number)
-        return _money(acc.balance)
+        # invariant: balances are already normalized (whole cents) on every write
+        return acc.balance
 
-    def deposit(self, account_number: str, amount: Decimal) -> Decimal:
-        amount = _money(amount)
-        lock = self._get_lock(account_number)
+    def deposit(self, account_number: str, amount: Decimal) -> int:
+        cents = _to_cents(amount)
+        # build the audit row up front; only the balance is filled in under the lock
+        row = {"ts": _now_iso(), "type": "deposit", "amount": format_cents(cents), "balance": None}
+        # accounts are never removed, so resolve it before locking
+        acc = self._require(account_number)
+        lock = self._lock_for(account_number)
         with lock:
-            acc = self._require(account_number)
-            acc.balance = _money(acc.balance + amount)
+            acc.balance += cents
             # append audit log
-            self._log[account_number].append(Txn(
-                ts=datetime.now(tz=timezone.utc),
-                type="deposit",
-                amount=amount,
-                balance=acc.balance
-            ))
+            row["balance"] = format_cents(acc.balance)
+            self._log[account_number].append(row)
             return acc.balance
 
-    def withdraw(self, account_number: str, amount: Decimal) -> Decimal:
-        amount = _money(amount)
-        lock = self._get_lock(account_number)
+    def withdraw(self, account_number: str, amount: Decimal) -> int:
+        cents = _to_cents(amount)
+        # build the audit row up front; only the balance is filled in under the lock
+        row = {"ts": _now_iso(), "type": "withdraw", "amount": format_cents(cents), "balance": None}
+        acc = self._require(account_number)
+        lock = self._lock_for(account_number)
         with lock:
-            acc = self._require(account_number)
-            if acc.balance < amount:
+            if acc.balance < cents:
                 raise ValueError("insufficient funds")
-            acc.balance = _money(acc.balance - amount)
+            acc.balance -= cents
             # append audit log
-            self._log[account_number].append(Txn(
-                ts=datetime.now(tz=timezone.utc),
-                type="withdraw",
-                amount=amount,
-                balance=acc.balance
-            ))
+            row["balance"] = format_cents(acc.balance)
+            self._log[account_number].append(row)
             return acc.balance
 
-    def transactions(self, account_number: str) -> list[Txn]:
+    def apply_batch(self, account_number: str, ops: List[Tuple[str, Decimal]]) -> int:
+        """Apply ("deposit" | "withdraw", amount) ops under one lock acquire.
+
+        All-or-nothing: if any withdraw would overdraw, nothing is applied.
+        """
+        rows = []
+        for typ, amount in ops:
+            if typ not in ("deposit", "withdraw"):
+                raise ValueError(f"unknown operation: {typ}")
+            cents = _to_cents(amount)
+            rows.append((cents if typ == "deposit" else -cents,
+                         {"ts": _now_iso(), "type": typ, "amount": format_cents(cents), "balance": None}))
+        acc = self._require(account_number)
+        lock = self._lock_for(account_number)
+        with lock:
+            bal = acc.balance
+            for delta, row in rows:
+                bal += delta
+                if bal < 0:
+                    raise ValueError("insufficient funds")
+                row["balance"] = format_cents(bal)
+            acc.balance = bal
+            self._log[account_number].extend(row for _, row in rows)
+            return bal
+
+    def transactions(self, account_number: str, limit: int = 100, offset: int = 0) -> list[dict]:
+        """Return up to `limit` rows, oldest first, skipping the `offset` most recent."""
         self._require(account_number)
-        return list(self._log[account_number])
+        lock = self._lock_for(account_number)
+        # deques can't be iterated while another thread appends
+        with lock:
+            rows = list(islice(reversed(self._log[account_number]), offset, offset + limit))
+        rows.reverse()
+        return rows
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from fastapi.testclient import TestClient
 from app.main import app
 
@@ -6,7 +8,7 @@ client = TestClient(app)
 def test_health():
     r = client.get("/healthz")
     assert r.status_code == 200
-    assert r.json()["status"] == "ok"
+    assert r.json() == {"status": "ok", "version": app.version}
 
 def test_balance_seed():
     r = client.get("/accounts/1001/balance")
@@ -67,3 +69,86 @@ def test_transactions_log_populates():
     assert isinstance(data["transactions"], list)
     assert len(data["transactions"]) >= 2
     assert set(data["transactions"][-1].keys()) == {"ts", "type", "amount", "balance"}
+
+def test_transactions_limit_and_offset():
+    client.post("/accounts/1002/deposit", json={"amount": "3.00"})
+    client.post("/accounts/1002/deposit", json={"amount": "4.00"})
+    r = client.get("/accounts/1002/transactions", params={"limit": 1})
+    assert r.status_code == 200
+    txs = r.json()["transactions"]
+    assert len(txs) == 1
+    assert txs[0]["amount"] == "4.00"
+    r = client.get("/accounts/1002/transactions", params={"limit": 1, "offset": 1})
+    assert r.json()["transactions"][0]["amount"] == "3.00"
+    r = client.get("/accounts/1002/transactions", params={"offset": 10_000})
+    assert r.json()["transactions"] == []
+
+def test_batch_applies_all_ops():
+    before = client.get("/accounts/1002/balance").json()["balance"]
+    ops = [{"type": "deposit", "amount": "10.00"}, {"type": "withdraw", "amount": "2.50"}]
+    r = client.post("/accounts/1002/batch", json={"ops": ops})
+    assert r.status_code == 200
+    assert r.json()["balance"] == str(Decimal(before) + Decimal("7.50"))
+    txs = client.get("/accounts/1002/transactions", params={"limit": 2}).json()["transactions"]
+    assert [t["type"] for t in txs] == ["deposit", "withdraw"]
+
+def test_batch_overdraft_applies_nothing():
+    ops = [{"type": "deposit", "amount": "1.00"}, {"type": "withdraw", "amount": "5.00"}]
+    r = client.post("/accounts/9999/batch", json={"ops": ops})
+    assert r.status_code == 400
+    assert "error" in r.json()
+    assert client.get("/accounts/9999/balance").json()["balance"] == "0.00"
+
+def test_expired_idempotency_entries_are_swept():
+    from app import main
+    key = "idem-sweep"
+    client.post("/accounts/1001/deposit", headers={"Idempotency-Key": key}, json={"amount": "1.00"})
+    lock, shard, _ = main.idemp_shards[hash(key) & (main.IDEMP_SHARDS - 1)]
+    assert key in shard
+    # a busy shard is skipped, not waited on
+    with lock:
+        main._evict_expired(shard[key][0] + main.IDEMP_TTL + 1)
+    assert key in shard
+    main._evict_expired(shard[key][0] + main.IDEMP_TTL + 1)
+    assert key not in shard
+
+def test_lifespan_runs_background_sweeper(monkeypatch):
+    import time
+    from app import main
+    key = "idem-lifespan"
+    _, shard, _ = main.idemp_shards[hash(key) & (main.IDEMP_SHARDS - 1)]
+    shard[key] = (0.0, {})
+    shard.move_to_end(key, last=False)
+    monkeypatch.setattr(main, "IDEMP_SWEEP_INTERVAL", 0.01)
+    with TestClient(app):
+        deadline = time.monotonic() + 2
+        while key in shard and time.monotonic() < deadline:
+            time.sleep(0.01)
+    assert key not in shard
+
+def test_amounts_round_half_up_to_cents():
+    # 9999 starts at 0.00; 0.005 rounds up, 0.0049 rounds down
+    r = client.post("/accounts/9999/deposit", json={"amount": "0.005"})
+    assert r.json()["balance"] == "0.01"
+    r = client.post("/accounts/9999/deposit", json={"amount": "0.0049"})
+    assert r.json()["balance"] == "0.01"
+    r = client.post("/accounts/9999/withdraw", json={"amount": "0.01"})
+    assert r.json()["balance"] == "0.00"
+
+def test_concurrent_same_key_requests_apply_once():
+    import threading, time
+    from app import main
+    calls = []
+    def compute(n):
+        calls.append(n)
+        time.sleep(0.05)
+        return {"n": n}
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(main.idempotent_response("idem-race", compute, i)))
+               for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == [{"n": calls[0]}] * 5